@@ -0,0 +1,163 @@
+"""Config flow for Xiaomi Miio Opple Light."""
+from __future__ import annotations
+
+import logging
+
+import voluptuous as vol
+
+import homeassistant.helpers.config_validation as cv
+from homeassistant import config_entries
+from homeassistant.const import CONF_HOST, CONF_NAME, CONF_SCAN_INTERVAL, CONF_TOKEN
+from homeassistant.core import callback
+from homeassistant.data_entry_flow import FlowResult
+
+from miio import DeviceException
+
+from .const import (
+    DOMAIN,
+    MIN_SCAN_INTERVAL,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_COMMAND_TIMEOUT,
+    DEFAULT_COMMAND_RETRIES,
+    DEFAULT_POLL_TIMEOUT,
+    DEFAULT_POLL_RETRIES,
+    DEFAULT_MIN_BRIGHTNESS,
+    DEFAULT_MAX_BRIGHTNESS,
+    DEFAULT_MIN_COLOR_TEMPERATURE,
+    DEFAULT_MAX_COLOR_TEMPERATURE,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_COMMAND_TIMEOUT,
+    CONF_COMMAND_RETRIES,
+    CONF_POLL_TIMEOUT,
+    CONF_POLL_RETRIES,
+    CONF_OPTIMISTIC,
+    CONF_VERIFY_DELAY,
+    CONF_MIN_BRIGHTNESS,
+    CONF_MAX_BRIGHTNESS,
+    CONF_MIN_COLOR_TEMPERATURE,
+    CONF_MAX_COLOR_TEMPERATURE
+)
+from .coordinator import async_get_coordinator
+from .protocol import MiioSession
+
+_LOGGER = logging.getLogger(__name__)
+
+USER_SCHEMA = vol.Schema({
+    vol.Required(CONF_NAME): cv.string,
+    vol.Required(CONF_HOST): cv.string,
+    vol.Required(CONF_TOKEN): vol.All(cv.string, vol.Length(min=32, max=32)),
+})
+
+
+class OppleLightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    """Add one lamp per config entry."""
+
+    VERSION = 1
+
+    async def async_step_user(self, user_input: dict | None = None) -> FlowResult:
+        errors = {}
+        if user_input is not None:
+            try:
+                bytes.fromhex(user_input[CONF_TOKEN])
+                coordinator = await async_get_coordinator(self.hass)
+                # A throwaway session: a mistyped token must not replace the
+                # session of a lamp that is already running. SyncBaseInfo is
+                # never cached, so the round trip checks the token.
+                device = MiioSession(
+                    coordinator.transport, user_input[CONF_HOST], user_input[CONF_TOKEN]
+                )
+                try:
+                    await device.send('SyncBaseInfo', timeout=DEFAULT_POLL_TIMEOUT, retries=0)
+                    device_info = await coordinator.async_device_info(device, DEFAULT_POLL_TIMEOUT)
+                finally:
+                    device.close()
+            except ValueError:
+                errors[CONF_TOKEN] = "invalid_token"
+            except DeviceException as ex:
+                _LOGGER.debug("Unable to connect to %s: %s", user_input[CONF_HOST], ex)
+                errors["base"] = "cannot_connect"
+            else:
+                await self.async_set_unique_id(
+                    "{}-{}".format(device_info.get('model'), device_info.get('mac'))
+                )
+                self._abort_if_unique_id_configured(
+                    updates={CONF_HOST: user_input[CONF_HOST], CONF_TOKEN: user_input[CONF_TOKEN]}
+                )
+                return self.async_create_entry(title=user_input[CONF_NAME], data=user_input)
+
+        return self.async_show_form(step_id="user", data_schema=USER_SCHEMA, errors=errors)
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> OppleLightOptionsFlow:
+        return OppleLightOptionsFlow(config_entry)
+
+
+class OppleLightOptionsFlow(config_entries.OptionsFlow):
+    """Polling and range options; saving them reloads only this lamp."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        self._entry = config_entry
+
+    async def async_step_init(self, user_input: dict | None = None) -> FlowResult:
+        errors = {}
+        if user_input is not None:
+            if user_input[CONF_MIN_BRIGHTNESS] >= user_input[CONF_MAX_BRIGHTNESS]:
+                errors[CONF_MAX_BRIGHTNESS] = "invalid_brightness_range"
+            if user_input[CONF_MIN_COLOR_TEMPERATURE] >= user_input[CONF_MAX_COLOR_TEMPERATURE]:
+                errors[CONF_MAX_COLOR_TEMPERATURE] = "invalid_color_temperature_range"
+            if not errors:
+                return self.async_create_entry(title="", data=user_input)
+
+        # Keep what was entered when the form is shown again with errors
+        options = user_input or self._entry.options
+        schema = vol.Schema({
+            vol.Optional(
+                CONF_SCAN_INTERVAL,
+                default=options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL.seconds)
+            ): vol.All(vol.Coerce(int), vol.Range(min=MIN_SCAN_INTERVAL.seconds)),
+            vol.Optional(
+                CONF_MAX_SCAN_INTERVAL,
+                default=options.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL.seconds)
+            ): vol.All(vol.Coerce(int), vol.Range(min=MIN_SCAN_INTERVAL.seconds)),
+            vol.Optional(
+                CONF_COMMAND_TIMEOUT,
+                default=options.get(CONF_COMMAND_TIMEOUT, DEFAULT_COMMAND_TIMEOUT)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+            vol.Optional(
+                CONF_COMMAND_RETRIES,
+                default=options.get(CONF_COMMAND_RETRIES, DEFAULT_COMMAND_RETRIES)
+            ): cv.positive_int,
+            vol.Optional(
+                CONF_POLL_TIMEOUT,
+                default=options.get(CONF_POLL_TIMEOUT, DEFAULT_POLL_TIMEOUT)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+            vol.Optional(
+                CONF_POLL_RETRIES,
+                default=options.get(CONF_POLL_RETRIES, DEFAULT_POLL_RETRIES)
+            ): cv.positive_int,
+            vol.Optional(
+                CONF_OPTIMISTIC, default=options.get(CONF_OPTIMISTIC, False)
+            ): cv.boolean,
+            vol.Optional(
+                CONF_VERIFY_DELAY, default=options.get(CONF_VERIFY_DELAY, 0)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Optional(
+                CONF_MIN_BRIGHTNESS,
+                default=options.get(CONF_MIN_BRIGHTNESS, DEFAULT_MIN_BRIGHTNESS)
+            ): cv.positive_int,
+            vol.Optional(
+                CONF_MAX_BRIGHTNESS,
+                default=options.get(CONF_MAX_BRIGHTNESS, DEFAULT_MAX_BRIGHTNESS)
+            ): cv.positive_int,
+            vol.Optional(
+                CONF_MIN_COLOR_TEMPERATURE,
+                default=options.get(CONF_MIN_COLOR_TEMPERATURE, DEFAULT_MIN_COLOR_TEMPERATURE)
+            ): cv.positive_int,
+            vol.Optional(
+                CONF_MAX_COLOR_TEMPERATURE,
+                default=options.get(CONF_MAX_COLOR_TEMPERATURE, DEFAULT_MAX_COLOR_TEMPERATURE)
+            ): cv.positive_int,
+        })
+        return self.async_show_form(step_id="init", data_schema=schema, errors=errors)
@@ -0,0 +1,34 @@
+"""Constants for the Xiaomi Miio Opple Light integration."""
+from datetime import timedelta
+
+DOMAIN = "xiaomi_miio_opple_light"
+DATA_KEY = 'light.xiaomi_miio_opple_light'
+
+MIN_SCAN_INTERVAL = timedelta(seconds=5)
+DEFAULT_SCAN_INTERVAL = timedelta(seconds=10)
+DEFAULT_MAX_SCAN_INTERVAL = timedelta(seconds=60)
+
+DEFAULT_COMMAND_TIMEOUT = 1.5
+DEFAULT_COMMAND_RETRIES = 1
+DEFAULT_POLL_TIMEOUT = 5
+DEFAULT_POLL_RETRIES = 2
+
+DEFAULT_MIN_BRIGHTNESS = 7
+DEFAULT_MAX_BRIGHTNESS = 100
+DEFAULT_MIN_COLOR_TEMPERATURE = 3000
+DEFAULT_MAX_COLOR_TEMPERATURE = 5700
+
+CONF_MAX_SCAN_INTERVAL = 'max_scan_interval'
+CONF_COMMAND_TIMEOUT = 'command_timeout'
+CONF_COMMAND_RETRIES = 'command_retries'
+CONF_POLL_TIMEOUT = 'poll_timeout'
+CONF_POLL_RETRIES = 'poll_retries'
+CONF_OPTIMISTIC = 'optimistic'
+CONF_VERIFY_DELAY = 'verify_delay'
+CONF_MAX_PARALLEL_REQUESTS = 'max_parallel_requests'
+CONF_BLOCKING_THRESHOLD = 'blocking_threshold'
+
+CONF_MIN_BRIGHTNESS = 'min_brightness'
+CONF_MAX_BRIGHTNESS = 'max_brightness'
+CONF_MIN_COLOR_TEMPERATURE = 'min_color_temperature'
+CONF_MAX_COLOR_TEMPERATURE = 'max_color_temperature'
@@ -0,0 +1,304 @@
+"""Shared polling for all Opple lights."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import random
+import time
+
+from datetime import timedelta
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+
+from miio.exceptions import DeviceException
+
+from . import metrics
+from .const import DATA_KEY
+from .protocol import MiioSession, MiioTransport
+
+TICK_INTERVAL = timedelta(seconds=1)
+MAX_PARALLEL_POLLS = 8
+BACKOFF_FACTOR = 2
+FAILURE_THRESHOLD = 3
+MAX_RETRY_INTERVAL = 300
+
+STORAGE_VERSION = 1
+STORAGE_KEY = 'xiaomi_miio_opple_light.sessions'
+DEVICES_STORAGE_KEY = 'xiaomi_miio_opple_light.devices'
+SAVE_DELAY = 10
+DEVICE_INFO_TTL = timedelta(days=1)
+DEVICE_INFO_KEYS = ('model', 'mac', 'fw_ver', 'hw_ver')
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_get_coordinator(hass: HomeAssistant) -> OppleCoordinator:
+    """Return the coordinator shared by all lamps, creating it on first use."""
+    coordinator = hass.data.get(DATA_KEY)
+    if coordinator is None:
+        coordinator = hass.data[DATA_KEY] = OppleCoordinator(hass)
+        unregister_metrics = metrics.register(coordinator)
+
+        @callback
+        def _shutdown(event):
+            unregister_metrics()
+            coordinator.async_shutdown()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _shutdown)
+    await coordinator.async_load()
+    return coordinator
+
+
+class CircuitBreaker:
+    """Counts consecutive failures of a host.
+
+    The breaker opens after FAILURE_THRESHOLD failures in a row; while it
+    is open the host is retried with exponential backoff and jitter.
+    """
+
+    def __init__(self) -> None:
+        self.failures = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= FAILURE_THRESHOLD
+
+    def record_success(self) -> bool:
+        """Reset the breaker, return True if it was open."""
+        was_open = self.is_open
+        self.failures = 0
+        return was_open
+
+    def record_failure(self) -> bool:
+        """Count a failure, return True if this opened the breaker."""
+        self.failures += 1
+        return self.failures == FAILURE_THRESHOLD
+
+    def retry_delay(self, interval: float) -> float:
+        delay = min(
+            interval * BACKOFF_FACTOR ** (self.failures - FAILURE_THRESHOLD + 1),
+            MAX_RETRY_INTERVAL
+        )
+        return random.uniform(delay / 2, delay)
+
+
+class OppleCoordinator:
+    """Owns the miio transport and polls every lamp from a single timer.
+
+    Each host gets its own due time, spread randomly across its scan
+    interval when it is added, so lamps don't all poll on the same tick.
+
+    Polling is adaptive: a host is polled every scan_interval right after a
+    command or an external change, and the interval doubles on every
+    unchanged result up to max_scan_interval. Hosts whose circuit breaker
+    is open are retried according to CircuitBreaker.retry_delay instead.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self.transport = MiioTransport()
+        self.transport.on_handshake = self._async_handshake_done
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._stamps = None
+        self._devices_store = Store(hass, STORAGE_VERSION, DEVICES_STORAGE_KEY)
+        self._devices = None
+        self._load_lock = asyncio.Lock()
+        self.entities = {}
+        self._intervals = {}
+        self._min_intervals = {}
+        self._max_intervals = {}
+        self._next_poll = {}
+        self._polling = set()
+        self.poll_lag = {}
+        self._verify_handles = {}
+        self._pending_verify = set()
+        self._semaphore = asyncio.Semaphore(MAX_PARALLEL_POLLS)
+        self._remove_tick = None
+
+    async def async_load(self) -> None:
+        """Load the device stamps and info saved by a previous run."""
+        async with self._load_lock:
+            if self._stamps is None:
+                self._stamps = await self._store.async_load() or {}
+            if self._devices is None:
+                self._devices = await self._devices_store.async_load() or {}
+
+    async def async_device_info(self, session: MiioSession, timeout: float) -> dict:
+        """Return miIO.info of a host, from storage while it is fresh.
+
+        The info is refreshed after DEVICE_INFO_TTL; if the lamp can't be
+        reached then, the stale copy is used. Entries are tied to the token, so
+        a different lamp that took over the address is never given them.
+        """
+        token = hashlib.sha256(session.token.encode()).hexdigest()[:16]
+        cached = self._devices.get(session.host)
+        if cached is not None and cached.get('token') != token:
+            cached = None
+        if cached is not None and time.time() - cached['fetched_at'] < DEVICE_INFO_TTL.total_seconds():
+            return cached['info']
+        try:
+            info = await session.send('miIO.info', timeout=timeout, retries=0)
+        except DeviceException:
+            if cached is None:
+                raise
+            return cached['info']
+        self._devices[session.host] = {
+            'info': {key: info.get(key) for key in DEVICE_INFO_KEYS},
+            'token': token,
+            'fetched_at': time.time(),
+        }
+        self._devices_store.async_delay_save(lambda: self._devices, SAVE_DELAY)
+        return self._devices[session.host]['info']
+
+    def session(self, host: str, token: str) -> MiioSession:
+        """Return the session for a host, reusing its saved handshake.
+
+        Stamps are saved with the wall clock time they were taken at, so the
+        device timestamp can be advanced by the time HA was down.
+        """
+        session = self.transport.session(host, token)
+        stamp = (self._stamps or {}).get(host)
+        if stamp is not None:
+            session.restore(
+                stamp['device_id'],
+                stamp['device_ts'] + max(0, int(time.time() - stamp['saved_at']))
+            )
+        return session
+
+    @callback
+    def _async_handshake_done(self, session: MiioSession) -> None:
+        _LOGGER.debug('%s: handshake #%d', session.host, session.handshakes)
+        device_id, device_ts = session.stamp
+        if self._stamps is None:
+            self._stamps = {}
+        self._stamps[session.host] = {
+            'device_id': device_id,
+            'device_ts': device_ts,
+            'saved_at': time.time(),
+        }
+        self._store.async_delay_save(lambda: self._stamps, SAVE_DELAY)
+
+    @callback
+    def async_add(
+        self,
+        host: str,
+        entity,
+        scan_interval: timedelta,
+        max_scan_interval: timedelta
+    ) -> None:
+        """Start polling a lamp."""
+        interval = scan_interval.total_seconds()
+        self.entities[host] = entity
+        self._intervals[host] = interval
+        self._min_intervals[host] = interval
+        self._max_intervals[host] = max(interval, max_scan_interval.total_seconds())
+        self._next_poll[host] = time.monotonic() + random.uniform(0, interval)
+        if self._remove_tick is None:
+            self._remove_tick = async_track_time_interval(
+                self.hass, self._async_tick, TICK_INTERVAL
+            )
+
+    @callback
+    def async_remove(self, host: str) -> None:
+        """Stop polling a lamp."""
+        self.entities.pop(host, None)
+        self._intervals.pop(host, None)
+        self._min_intervals.pop(host, None)
+        self._max_intervals.pop(host, None)
+        self._next_poll.pop(host, None)
+        self.poll_lag.pop(host, None)
+        handle = self._verify_handles.pop(host, None)
+        if handle is not None:
+            handle.cancel()
+        self._pending_verify.discard(host)
+        if not self.entities and self._remove_tick is not None:
+            self._remove_tick()
+            self._remove_tick = None
+
+    def poll_interval(self, host: str) -> float | None:
+        """Return the current adaptive poll interval of a host in seconds."""
+        return self._intervals.get(host)
+
+    @callback
+    def async_boost(self, host: str) -> None:
+        """Poll a lamp at its fastest rate again, e.g. after a command."""
+        if host not in self._next_poll:
+            return
+        interval = self._intervals[host] = self._min_intervals[host]
+        self._next_poll[host] = min(self._next_poll[host], time.monotonic() + interval)
+
+    @callback
+    def async_verify(self, host: str, delay: float) -> None:
+        """Poll a lamp once, delay seconds after the last of a burst of writes."""
+        handle = self._verify_handles.pop(host, None)
+        if handle is not None:
+            handle.cancel()
+        self._verify_handles[host] = self.hass.loop.call_later(
+            delay, self._async_verify_now, host
+        )
+
+    @callback
+    def _async_verify_now(self, host: str) -> None:
+        self._verify_handles.pop(host, None)
+        if host in self._polling:
+            # The running poll may have read the state before the writes
+            # landed, so poll again once it is done
+            self._pending_verify.add(host)
+        elif host in self._next_poll:
+            self._async_start_poll(host)
+
+    @callback
+    def async_shutdown(self) -> None:
+        for handle in self._verify_handles.values():
+            handle.cancel()
+        self._verify_handles.clear()
+        self._pending_verify.clear()
+        if self._remove_tick is not None:
+            self._remove_tick()
+            self._remove_tick = None
+        self.transport.close()
+
+    @callback
+    def _async_tick(self, now=None) -> None:
+        monotonic = time.monotonic()
+        for host, due in self._next_poll.items():
+            if due <= monotonic:
+                self._async_start_poll(host)
+
+    @callback
+    def _async_start_poll(self, host: str) -> None:
+        if host not in self._polling:
+            self._polling.add(host)
+            self.hass.async_create_task(self._async_poll(host))
+
+    async def _async_poll(self, host: str) -> None:
+        due = self._next_poll.get(host, 0)
+        try:
+            async with self._semaphore:
+                entity = self.entities.get(host)
+                if entity is None:
+                    return
+                self.poll_lag[host] = max(0.0, time.monotonic() - due)
+                changed = await entity.async_schedule_update()
+            if host in self._intervals:
+                if entity.breaker.is_open:
+                    self._intervals[host] = entity.breaker.retry_delay(
+                        self._min_intervals[host]
+                    )
+                elif changed:
+                    self._intervals[host] = self._min_intervals[host]
+                else:
+                    self._intervals[host] = min(
+                        self._intervals[host] * BACKOFF_FACTOR, self._max_intervals[host]
+                    )
+        finally:
+            self._polling.discard(host)
+            if host in self._next_poll:
+                self._next_poll[host] = time.monotonic() + self._intervals[host]
+                if host in self._pending_verify:
+                    self._pending_verify.discard(host)
+                    self._async_start_poll(host)
@@ -0,0 +1,45 @@
+"""Diagnostics support for Opple lights."""
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_TOKEN
+from homeassistant.core import HomeAssistant
+
+from .coordinator import async_get_coordinator
+
+TO_REDACT = {CONF_TOKEN, 'mac'}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    coordinator = await async_get_coordinator(hass)
+    host = entry.data[CONF_HOST]
+    # Not coordinator.session(), which would put a stored stamp back
+    device = coordinator.transport.session(host, entry.data[CONF_TOKEN])
+    limiter = coordinator.transport.limiter
+    entity = coordinator.entities.get(host)
+    detector = coordinator.transport.blocking_detector
+    return {
+        'entry': async_redact_data(dict(entry.data), TO_REDACT),
+        'options': dict(entry.options),
+        'session': {'handshakes': device.handshakes, **device.stats.as_dict()},
+        'light': None if entity is None else {
+            'available': entity.available,
+            'breaker_failures': entity.breaker.failures,
+            'suppressed_writes': entity.suppressed_writes,
+        },
+        'limiter': {
+            'limit': limiter.limit,
+            'active': limiter.active,
+            'queued': limiter.queued,
+            'requests': limiter.requests,
+            'wait_time': limiter.wait_time,
+            'max_wait_time': limiter.max_wait_time,
+        },
+        'blocking': None if detector is None else {
+            'threshold': detector.threshold,
+            'calls': detector.calls,
+            'slow_calls': detector.slow_calls,
+            'max_blocked': detector.max_blocked,
+        },
+    }
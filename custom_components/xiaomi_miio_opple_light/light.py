@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 import logging
+import time
+from typing import Any
 
 import voluptuous as vol
 import asyncio
@@ -12,55 +14,134 @@ from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
     ATTR_COLOR_TEMP,
     ATTR_HS_COLOR,
+    ATTR_TRANSITION,
     PLATFORM_SCHEMA,
     LightEntity,
     SUPPORT_BRIGHTNESS,
     SUPPORT_COLOR_TEMP,
-    SUPPORT_COLOR)
+    SUPPORT_COLOR,
+    SUPPORT_TRANSITION)
+from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
     CONF_NAME,
+    CONF_PLATFORM,
     CONF_HOST,
     CONF_TOKEN,
     ATTR_ENTITY_ID,
     CONF_SCAN_INTERVAL
 )
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback
+)
 from homeassistant.exceptions import PlatformNotReady
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
-from homeassistant.helpers.event import async_track_time_interval
 
-from miio import Device, DeviceException
-from math import ceil, floor
+from miio import DeviceException
 from datetime import timedelta
 
-DOMAIN = "xiaomi_miio_opple_light"
-DATA_KEY = 'light.xiaomi_miio_opple_light'
+from .const import (
+    DOMAIN,
+    DATA_KEY,
+    MIN_SCAN_INTERVAL,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_COMMAND_TIMEOUT,
+    DEFAULT_COMMAND_RETRIES,
+    DEFAULT_POLL_TIMEOUT,
+    DEFAULT_POLL_RETRIES,
+    DEFAULT_MIN_BRIGHTNESS,
+    DEFAULT_MAX_BRIGHTNESS,
+    DEFAULT_MIN_COLOR_TEMPERATURE,
+    DEFAULT_MAX_COLOR_TEMPERATURE,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_COMMAND_TIMEOUT,
+    CONF_COMMAND_RETRIES,
+    CONF_POLL_TIMEOUT,
+    CONF_POLL_RETRIES,
+    CONF_OPTIMISTIC,
+    CONF_VERIFY_DELAY,
+    CONF_MAX_PARALLEL_REQUESTS,
+    CONF_BLOCKING_THRESHOLD,
+    CONF_MIN_BRIGHTNESS,
+    CONF_MAX_BRIGHTNESS,
+    CONF_MIN_COLOR_TEMPERATURE,
+    CONF_MAX_COLOR_TEMPERATURE
+)
+from .coordinator import CircuitBreaker, async_get_coordinator
+from .mapping import BrightnessMap, ColorTempMap
+from .protocol import DEFAULT_MAX_PARALLEL_REQUESTS, MiioSession
 
-MIN_SCAN_INTERVAL = timedelta(seconds=5)
-DEFAULT_SCAN_INTERVAL = timedelta(seconds=10)
+SERVICE_SET_GROUP = 'set_group'
+ATTR_STATE = 'state'
 
-CONF_MIN_BRIGHTNESS = 'min_brightness'
-CONF_MAX_BRIGHTNESS = 'max_brightness'
-CONF_MIN_COLOR_TEMPERATURE = 'min_color_temperature'
-CONF_MAX_COLOR_TEMPERATURE = 'max_color_temperature'
+DEFAULT_SUPPORTED_FEATURES = SUPPORT_BRIGHTNESS | SUPPORT_COLOR_TEMP | SUPPORT_TRANSITION
 
-DEFAULT_SUPPORTED_FEATURES = SUPPORT_BRIGHTNESS | SUPPORT_COLOR_TEMP
+# Transitions are stepped in software; a step is never sent faster than
+# every MIN_TRANSITION_STEP seconds or TRANSITION_RTT_FACTOR round trips.
+RAMP_METHODS = ('SetBrightness', 'SetColorTemperature')
+MIN_TRANSITION_STEP = 0.2
+TRANSITION_RTT_FACTOR = 2
+RTT_SMOOTHING = 0.2
 
 _LOGGER = logging.getLogger(__name__)
 
+
+def _validate_ranges(config: dict) -> dict:
+    if config[CONF_MIN_BRIGHTNESS] >= config[CONF_MAX_BRIGHTNESS]:
+        raise vol.Invalid('min_brightness must be lower than max_brightness')
+    if config[CONF_MIN_COLOR_TEMPERATURE] >= config[CONF_MAX_COLOR_TEMPERATURE]:
+        raise vol.Invalid('min_color_temperature must be lower than max_color_temperature')
+    return config
+
+
 # Validation of the user's configuration
-PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
+PLATFORM_SCHEMA = vol.All(PLATFORM_SCHEMA.extend({
     vol.Required(CONF_NAME): cv.string,
     vol.Required(CONF_HOST): cv.string,
     vol.Required(CONF_TOKEN): cv.string,
     vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL):
         vol.All(cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL)),
-    vol.Optional(CONF_MIN_BRIGHTNESS, default=7): cv.positive_int,
-    vol.Optional(CONF_MAX_BRIGHTNESS, default=100): cv.positive_int,
-    vol.Optional(CONF_MIN_COLOR_TEMPERATURE, default=3000): cv.positive_int,
-    vol.Optional(CONF_MAX_COLOR_TEMPERATURE, default=5700): cv.positive_int
-})
+    vol.Optional(CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_SCAN_INTERVAL):
+        vol.All(cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL)),
+    # A timeout of 0 would fail every request and open the circuit breaker
+    vol.Optional(CONF_COMMAND_TIMEOUT, default=DEFAULT_COMMAND_TIMEOUT):
+        vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+    vol.Optional(CONF_COMMAND_RETRIES, default=DEFAULT_COMMAND_RETRIES): cv.positive_int,
+    vol.Optional(CONF_POLL_TIMEOUT, default=DEFAULT_POLL_TIMEOUT):
+        vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+    vol.Optional(CONF_POLL_RETRIES, default=DEFAULT_POLL_RETRIES): cv.positive_int,
+    vol.Optional(CONF_OPTIMISTIC, default=False): cv.boolean,
+    vol.Optional(CONF_VERIFY_DELAY): cv.time_period,
+    # Shared by all lamps; the smallest configured value wins
+    vol.Optional(CONF_MAX_PARALLEL_REQUESTS, default=DEFAULT_MAX_PARALLEL_REQUESTS):
+        vol.All(vol.Coerce(int), vol.Range(min=1)),
+    # Debugging aid, also shared: warn about device calls that block the
+    # event loop for longer than this many seconds
+    vol.Optional(CONF_BLOCKING_THRESHOLD): cv.positive_float,
+    vol.Optional(CONF_MIN_BRIGHTNESS, default=DEFAULT_MIN_BRIGHTNESS): cv.positive_int,
+    vol.Optional(CONF_MAX_BRIGHTNESS, default=DEFAULT_MAX_BRIGHTNESS): cv.positive_int,
+    vol.Optional(CONF_MIN_COLOR_TEMPERATURE, default=DEFAULT_MIN_COLOR_TEMPERATURE): cv.positive_int,
+    vol.Optional(CONF_MAX_COLOR_TEMPERATURE, default=DEFAULT_MAX_COLOR_TEMPERATURE): cv.positive_int
+}), _validate_ranges)
+
+
+def _validate_set_group(data: dict) -> dict:
+    if not data[ATTR_STATE] and (ATTR_BRIGHTNESS in data or ATTR_COLOR_TEMP in data):
+        raise vol.Invalid('brightness and color_temp can only be set with state: true')
+    return data
+
+
+SET_GROUP_SCHEMA = vol.All(vol.Schema({
+    vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_STATE, default=True): cv.boolean,
+    vol.Optional(ATTR_BRIGHTNESS): vol.All(vol.Coerce(int), vol.Range(min=1, max=255)),
+    vol.Optional(ATTR_COLOR_TEMP): vol.All(vol.Coerce(int), vol.Range(min=1))
+}), _validate_set_group)
 
 async def async_setup_platform(
     hass: HomeAssistant,
@@ -68,33 +149,144 @@ async def async_setup_platform(
     async_add_entities: AddEntitiesCallback,
     discovery_info: DiscoveryInfoType | None = None
 ) -> None:
-    if DATA_KEY not in hass.data:
-        hass.data[DATA_KEY] = {}
+    await _async_setup_lamp(hass, config, async_add_entities)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback
+) -> None:
+    # Options are stored as plain numbers; the YAML schema fills in the
+    # defaults and converts them the same way as for platform configs.
+    config = PLATFORM_SCHEMA({CONF_PLATFORM: DOMAIN, **entry.data, **entry.options})
+    await _async_setup_lamp(hass, config, async_add_entities)
+
+
+async def _async_setup_lamp(
+    hass: HomeAssistant,
+    config: ConfigType,
+    async_add_entities: AddEntitiesCallback
+) -> None:
+    coordinator = await async_get_coordinator(hass)
+    if not hass.services.has_service(DOMAIN, SERVICE_SET_GROUP):
+        _async_register_services(hass)
 
     name = config.get(CONF_NAME)
     host = config.get(CONF_HOST)
     token = config.get(CONF_TOKEN)
     scan_interval = config.get(CONF_SCAN_INTERVAL)
+    max_scan_interval = config.get(CONF_MAX_SCAN_INTERVAL)
+    command_timeout = config.get(CONF_COMMAND_TIMEOUT)
+    command_retries = config.get(CONF_COMMAND_RETRIES)
+    poll_timeout = config.get(CONF_POLL_TIMEOUT)
+    poll_retries = config.get(CONF_POLL_RETRIES)
+    optimistic = config.get(CONF_OPTIMISTIC)
+    verify_delay = config.get(CONF_VERIFY_DELAY)
     
     min_brightness = config.get(CONF_MIN_BRIGHTNESS)
     max_brightness = config.get(CONF_MAX_BRIGHTNESS)
     min_color_temperature = config.get(CONF_MIN_COLOR_TEMPERATURE)
     max_color_temperature = config.get(CONF_MAX_COLOR_TEMPERATURE)
     
-    hub = OppleLight(hass, name, host, token, scan_interval, min_brightness, max_brightness, min_color_temperature, max_color_temperature)
-    hass.data[DATA_KEY][host] = hub
-    async_add_entities([hub], update_before_add=True)
+    limiter = coordinator.transport.limiter
+    limiter.set_limit(min(limiter.limit, config.get(CONF_MAX_PARALLEL_REQUESTS)))
+    if config.get(CONF_BLOCKING_THRESHOLD) is not None:
+        coordinator.transport.detect_blocking(config.get(CONF_BLOCKING_THRESHOLD))
+    device = coordinator.session(host, token)
+    # Each configured lamp is set up by its own async_setup_platform call,
+    # so probes of different lamps already run concurrently. Known lamps
+    # only need the initial state; give up after a single timeout, plus the
+    # retry the session adds if its stamp from storage turns out stale.
+    device_info, base_info = await asyncio.gather(
+        coordinator.async_device_info(device, poll_timeout),
+        device.send('SyncBaseInfo', timeout=poll_timeout, retries=0),
+        return_exceptions=True
+    )
+    if isinstance(device_info, DeviceException):
+        _LOGGER.error("Device unavailable or token incorrect: %s", device_info)
+        raise PlatformNotReady from device_info
+    if isinstance(device_info, BaseException):
+        raise device_info
+    if isinstance(base_info, DeviceException):
+        # The info is cached, so the entity can be added right away and
+        # polling picks up the state once the lamp answers.
+        _LOGGER.warning("%s did not answer, state unknown: %s", host, base_info)
+        base_info = None
+    elif isinstance(base_info, BaseException):
+        raise base_info
+    _LOGGER.info(
+        "%s %s detected",
+        device_info.get('fw_ver'),
+        device_info.get('hw_ver'),
+    )
+
+    hub = OppleLight(hass, name, device, device_info, scan_interval, max_scan_interval, command_timeout, command_retries, poll_timeout, poll_retries, optimistic, verify_delay, min_brightness, max_brightness, min_color_temperature, max_color_temperature)
+    if base_info is not None:
+        hub.set_base_info(base_info)
+    async_add_entities([hub])
     
 
+@callback
+def _async_register_services(hass: HomeAssistant) -> None:
+
+    async def async_set_group(call: ServiceCall) -> ServiceResponse:
+        """Apply one target state to many lamps concurrently.
+
+        Lamps whose circuit breaker is open are skipped, like light.turn_on
+        skips unavailable entities, and listed under 'unavailable'.
+        """
+        lamps = {entity.entity_id: entity for entity in hass.data[DATA_KEY].entities.values()}
+        kwargs = {
+            key: call.data[key] for key in (ATTR_BRIGHTNESS, ATTR_COLOR_TEMP) if key in call.data
+        }
+
+        async def _apply(entity: OppleLight) -> dict:
+            start = time.monotonic()
+            entity.cancel_transition()
+            if call.data[ATTR_STATE]:
+                commands = entity.turn_on_commands(**kwargs)
+            else:
+                commands = entity.turn_off_commands()
+            results = await entity.async_send_commands(commands)
+            return {
+                'success': all(results),
+                'latency_ms': round((time.monotonic() - start) * 1000),
+            }
+
+        entity_ids = [entity_id for entity_id in call.data[ATTR_ENTITY_ID] if entity_id in lamps]
+        for entity_id in set(call.data[ATTR_ENTITY_ID]) - set(entity_ids):
+            _LOGGER.warning('%s is not an Opple light', entity_id)
+        unavailable = [entity_id for entity_id in entity_ids if not lamps[entity_id].available]
+        for entity_id in unavailable:
+            _LOGGER.warning('%s is unavailable, skipping it', entity_id)
+        entity_ids = [entity_id for entity_id in entity_ids if entity_id not in unavailable]
+        results = await asyncio.gather(*(_apply(lamps[entity_id]) for entity_id in entity_ids))
+        return {'lamps': dict(zip(entity_ids, results)), 'unavailable': unavailable}
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_GROUP, async_set_group,
+        schema=SET_GROUP_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL
+    )
+
+
 class OppleLight(LightEntity):
 
     def __init__(
         self, 
         hass: HomeAssistant,
         name: str, 
-        host: str, 
-        token: str, 
-        scan_interval: int,
+        device: MiioSession,
+        device_info: dict,
+        scan_interval: timedelta,
+        max_scan_interval: timedelta,
+        command_timeout: float,
+        command_retries: int,
+        poll_timeout: float,
+        poll_retries: int,
+        optimistic: bool,
+        verify_delay: timedelta | None,
         min_brightness: int, 
         max_brightness: int, 
         min_color_temperature: int, 
@@ -102,63 +294,152 @@ class OppleLight(LightEntity):
     ) -> None:
         self.hass = hass
         self._name = name
-
-        try:
-            self._device = Device(host, token)
-            device_info = self._device.info()
-            self._unique_id = "{}-{}".format(device_info.model, device_info.mac_address)
-            _LOGGER.info(
-                "%s %s detected",
-                device_info.firmware_version,
-                device_info.hardware_version,
-            )
-        except DeviceException as ex:
-            _LOGGER.error("Device unavailable or token incorrect: %s", ex)
-            raise PlatformNotReady
+        self._device = device
+        self._unique_id = "{}-{}".format(device_info.get('model'), device_info.get('mac'))
+        self._device_info = device_info
 
         self._scan_interval = scan_interval
-        self._remove_update_interval = None
+        self._max_scan_interval = max_scan_interval
+        self._command_timeout = command_timeout
+        self._command_retries = command_retries
+        self._poll_timeout = poll_timeout
+        self._poll_retries = poll_retries
+        self._optimistic = optimistic
+        self._verify_delay = verify_delay
+        self._pending_commands = 0
+        self._transition_task = None
+        self._rtt = None
+        self._queued_commands = {}
+        self._command_locks = {}
         self._should_poll = False
+        self.breaker = CircuitBreaker()
+        self.suppressed_writes = 0
         
         self._state = None
         self._brightness = None
         self._color_temp = None
         
-        self._min_brightness = min_brightness
-        self._max_brightness = max_brightness
-        self._min_color_temperature = min_color_temperature
-        self._max_color_temperature = max_color_temperature
+        self._brightness_map = BrightnessMap(min_brightness, max_brightness)
+        self._color_temp_map = ColorTempMap(min_color_temperature, max_color_temperature)
         
     async def async_added_to_hass(self) -> None:
         """Start custom polling."""
-        self._remove_update_interval = async_track_time_interval(
-            self.hass, self.async_schedule_update, self._scan_interval
+        self.hass.data[DATA_KEY].async_add(
+            self._device.host, self, self._scan_interval, self._max_scan_interval
         )
 
     async def async_will_remove_from_hass(self) -> None:
-        """Stop custom polling."""
-        self._remove_update_interval()
+        """Stop custom polling and any running transition."""
+        self.cancel_transition()
+        self.hass.data[DATA_KEY].async_remove(self._device.host)
 
     @callback
-    async def async_schedule_update(self, event_time=None):
-        """Update the entity."""
-        await self.async_update()
+    async def async_schedule_update(self, event_time=None) -> bool:
+        """Update the entity and return whether the lamp state changed.
+
+        The HA state is only written when availability or
+        [state, color_temp, brightness] differs from what was last applied.
+        suppressed_writes only counts polls that returned unchanged data.
+        """
+        previous = (self.available, self._state, self._color_temp, self._brightness)
+        applied = await self.async_update()
+        if previous == (self.available, self._state, self._color_temp, self._brightness):
+            if applied:
+                self.suppressed_writes += 1
+            return False
         self.async_schedule_update_ha_state()
+        return True
 
-    async def async_update(self) -> None:
+    async def async_update(self) -> bool:
+        """Poll the lamp, return whether its state was applied."""
         try:
-            BaseInfo = self._device.raw_command('SyncBaseInfo', [])
-            self._state = BaseInfo[0]
-            self._brightness = BaseInfo[2]
-            self._color_temp = BaseInfo[1]
-            _LOGGER.debug('Sync_state. Result: %s', str(BaseInfo))
-        except Exception:
-            _LOGGER.error('Update state error.', exc_info=True)
+            # While the breaker is open a single attempt is enough to probe
+            # whether the lamp is back.
+            BaseInfo = await self._device.send(
+                'SyncBaseInfo', [],
+                timeout=self._poll_timeout,
+                retries=0 if self.breaker.is_open else self._poll_retries
+            )
+        except Exception as ex:
+            if self.breaker.record_failure():
+                _LOGGER.error('%s is unavailable: %s', self._device.host, ex)
+            else:
+                _LOGGER.debug('Update state error for %s: %s', self._device.host, ex)
+            return False
+        if self.breaker.record_success():
+            _LOGGER.info('%s is available again', self._device.host)
+        if self._pending_commands:
+            # The reply may predate the commands in flight; the boosted poll
+            # after they finish reconciles the state instead.
+            _LOGGER.debug('Ignoring sync_state while commands are pending')
+            return False
+        self.set_base_info(BaseInfo)
+        _LOGGER.debug('Sync_state. Result: %s', str(BaseInfo))
+        return True
+
+    def set_base_info(self, BaseInfo: list) -> None:
+        """Apply a SyncBaseInfo result: [state, color_temp, brightness]."""
+        self._state = BaseInfo[0]
+        self._brightness = BaseInfo[2]
+        self._color_temp = BaseInfo[1]
             
-    async def change_state(self, method: str, params: tuple) -> bool | None:
+    async def change_state(
+        self,
+        method: str,
+        params: list,
+        attribute: str | None = None,
+        value: Any = None
+    ) -> bool | None:
+        """Send a write and set attribute to value once the lamp acks it.
+
+        A write that is still waiting for an earlier write of the same
+        method to finish is replaced by newer calls (last write wins), so
+        rapid slider changes collapse into a single request. Every replaced
+        caller receives the result of the write that was actually sent.
+
+        The write runs in its own task, so cancelling the caller (e.g. a
+        transition step) only drops it while it is still queued and no newer
+        write has been merged into it.
+        """
+        queued = self._queued_commands.get(method)
+        if queued is not None:
+            queued[:3] = [params, attribute, value]
+            queued[4] = True
+            return await asyncio.shield(queued[3])
+        queued = self._queued_commands[method] = [params, attribute, value, None, False]
+        task = queued[3] = self.hass.async_create_task(self._async_send_queued(method, queued))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not queued[4] and self._queued_commands.get(method) is queued:
+                del self._queued_commands[method]
+                task.cancel()
+            raise
+
+    async def _async_send_queued(self, method: str, queued: list) -> bool | None:
+        async with self._command_locks.setdefault(method, asyncio.Lock()):
+            if self._queued_commands.get(method) is queued:
+                del self._queued_commands[method]
+            params, attribute, value = queued[:3]
+            result = await self._send_command(method, params)
+            if result and attribute is not None:
+                setattr(self, attribute, value)
+            return result
+
+    async def _send_command(self, method: str, params: list) -> bool | None:
         try:
-            res = self._device.raw_command(method, params)
-            _LOGGER.debug('Change_state for %s: %s. Result: %s', method, str(params), str(res))
+            start = time.monotonic()
+            res = await self._device.send(
+                method, params,
+                timeout=self._command_timeout,
+                retries=self._command_retries
+            )
+            rtt = time.monotonic() - start
+            self._rtt = rtt if self._rtt is None else self._rtt + RTT_SMOOTHING * (rtt - self._rtt)
+            _LOGGER.debug(
+                'Change_state for %s: %s. Result: %s (%.0f ms)',
+                method, str(params), str(res), rtt * 1000
+            )
             if (res[0] != 'ok'):
                 _LOGGER.error('Change_state failed for %s: %s', method, str(params))
                 return False
@@ -167,41 +448,133 @@ class OppleLight(LightEntity):
         except Exception:
             _LOGGER.error('Change_state error.', exc_info=True)
             
-    async def async_turn_on(self, **kwargs: Any) -> None:
+    async def async_send_commands(self, commands: list) -> list:
+        """Send (method, params, attribute, value) commands concurrently.
+
+        The firmware has no combined method, but it handles pipelined
+        requests fine, so a scene change costs one round trip. In optimistic
+        mode the values are shown right away and rolled back if the lamp
+        rejects them.
+        """
+        if self._optimistic:
+            previous = {attribute: getattr(self, attribute) for _, _, attribute, _ in commands}
+            for _, _, attribute, value in commands:
+                setattr(self, attribute, value)
+            self.async_schedule_update_ha_state()
+
+        start = time.monotonic()
+        self._pending_commands += 1
+        try:
+            results = await asyncio.gather(*(self.change_state(*command) for command in commands))
+        finally:
+            self._pending_commands -= 1
+        _LOGGER.debug(
+            'Applied %d commands in %.0f ms',
+            len(commands), (time.monotonic() - start) * 1000
+        )
+
+        if self._optimistic:
+            for (_, _, attribute, value), result in zip(commands, results):
+                # Leave the value alone if a newer command has replaced it
+                if not result and getattr(self, attribute) == value:
+                    setattr(self, attribute, previous[attribute])
+
+        coordinator = self.hass.data[DATA_KEY]
+        coordinator.async_boost(self._device.host)
+        if self._verify_delay:
+            # Read the state back once so firmware clamps show up quickly
+            coordinator.async_verify(self._device.host, self._verify_delay.total_seconds())
+        self.async_schedule_update_ha_state()
+        return results
+
+    def turn_on_commands(self, **kwargs: Any) -> list:
+        """Return the (method, params, attribute, value) commands for turn_on."""
+        commands = []
         if not self._state:
-            result = await self.change_state("SetState", [True])
-            if result:
-                self._state = True
+            commands.append(("SetState", [True], '_state', True))
         
         if self.supported_features & SUPPORT_BRIGHTNESS and ATTR_BRIGHTNESS in kwargs:
             brightness = kwargs[ATTR_BRIGHTNESS]
-            percent_brightness = ceil( (brightness - 1)*(self._max_brightness - self._min_brightness)/(255-1)+self._min_brightness )
+            percent_brightness = self._brightness_map.to_device(brightness)
             _LOGGER.debug('Setting brightness: %s %s%%', brightness, percent_brightness)
-            result = await self.change_state('SetBrightness', [percent_brightness])
-            if result:
-                self._brightness = brightness
+            commands.append(('SetBrightness', [percent_brightness], '_brightness', percent_brightness))
                 
         if self.supported_features & SUPPORT_COLOR_TEMP and ATTR_COLOR_TEMP in kwargs:
             mired = kwargs[ATTR_COLOR_TEMP]
-            color_temp = self.translate_mired(mired)
-            if color_temp < self._min_color_temperature:
-                color_temp = self._min_color_temperature
-            if color_temp > self._max_color_temperature:
-                color_temp = self._max_color_temperature
+            color_temp = self._color_temp_map.to_device(mired)
             _LOGGER.debug('Setting color temperature: %s mireds, %s ct', mired, color_temp)
-            result = await self.change_state('SetColorTemperature', [color_temp])
-            if result:
-                self._color_temp = color_temp
-        
-        self.async_schedule_update_ha_state()
-                
-    async def async_turn_off(self, **kwargs: Any) -> None:
+            commands.append(('SetColorTemperature', [color_temp], '_color_temp', color_temp))
+
+        return commands
+
+    def turn_off_commands(self) -> list:
+        """Return the (method, params, attribute, value) commands for turn_off."""
         if self._state:
-            result = await self.change_state("SetState", [False])
-            if result:
-                self._state = False
+            return [("SetState", [False], '_state', False)]
+        return []
+
+    @callback
+    def cancel_transition(self) -> None:
+        if self._transition_task is not None:
+            self._transition_task.cancel()
+            self._transition_task = None
+
+    async def _async_transition(self, duration: float, commands: list) -> None:
+        """Ramp brightness and color temperature to the targets in commands.
+
+        The step interval follows the measured round trip time, so slow
+        lamps get fewer, larger steps instead of a backlog. Turning on from
+        off fades in: brightness is set to the minimum before SetState and
+        ramps up from there, to the last brightness if none was given.
+        """
+        fade_in = any(command[0] == 'SetState' for command in commands)
+        if fade_in and self._brightness is not None and not any(
+            command[0] == 'SetBrightness' for command in commands
+        ):
+            commands = commands + [('SetBrightness', [self._brightness], '_brightness', self._brightness)]
+        ramps = []
+        for command in commands:
+            initial = getattr(self, command[2])
+            if fade_in and command[0] == 'SetBrightness':
+                initial = self._brightness_map.min_brightness
+            if command[0] in RAMP_METHODS and initial is not None:
+                ramps.append((command, initial))
+        others = [command for command in commands if command not in [ramp[0] for ramp in ramps]]
+        if fade_in and any(command[0] == 'SetBrightness' for command, _ in ramps):
+            floor = self._brightness_map.min_brightness
+            await self.async_send_commands([('SetBrightness', [floor], '_brightness', floor)])
+        if others:
+            await self.async_send_commands(others)
+        if not ramps:
+            return
+
+        step_interval = max(MIN_TRANSITION_STEP, TRANSITION_RTT_FACTOR * (self._rtt or 0))
+        steps = max(1, int(duration / step_interval))
+        _LOGGER.debug('Transition over %.1f s in %d steps', duration, steps)
+        start = time.monotonic()
+        for step in range(1, steps):
+            step_commands = []
+            for (method, params, attribute, _), initial in ramps:
+                value = round(initial + (params[0] - initial) * step / steps)
+                step_commands.append((method, [value], attribute, value))
+            await self.async_send_commands(step_commands)
+            await asyncio.sleep(max(0, start + step * step_interval - time.monotonic()))
+        await self.async_send_commands([ramp[0] for ramp in ramps])
+
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        self.cancel_transition()
+        commands = self.turn_on_commands(**kwargs)
+        if kwargs.get(ATTR_TRANSITION):
+            # Return right away; a newer command cancels the ramp
+            self._transition_task = self.hass.async_create_task(
+                self._async_transition(kwargs[ATTR_TRANSITION], commands)
+            )
+        else:
+            await self.async_send_commands(commands)
                 
-        self.async_schedule_update_ha_state()
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        self.cancel_transition()
+        await self.async_send_commands(self.turn_off_commands())
 
     @property
     def name(self) -> str:
@@ -212,6 +585,16 @@ class OppleLight(LightEntity):
     def unique_id(self) -> str:
         """Return an unique ID."""
         return self._unique_id
+
+    @property
+    def device_info(self) -> dict:
+        return {
+            'identifiers': {(DOMAIN, self._unique_id)},
+            'name': self._name,
+            'manufacturer': 'Opple',
+            'model': self._device_info.get('model'),
+            'sw_version': self._device_info.get('fw_ver'),
+        }
         
     @property
     def supported_features(self) -> int:
@@ -221,30 +604,39 @@ class OppleLight(LightEntity):
     def should_poll(self) -> bool | None:
         return self._should_poll
 
+    @property
+    def command_queue_depth(self) -> int:
+        """Return the number of writes waiting for or in flight to the lamp.
+
+        Also read by metrics scrapes outside the event loop, hence the copy.
+        """
+        return len(self._queued_commands) + sum(
+            lock.locked() for lock in list(self._command_locks.values())
+        )
+
+    @property
+    def available(self) -> bool:
+        return not self.breaker.is_open
+
     @property
     def is_on(self) -> bool | None:
         """Return true if light is on."""
         return self._state
 
     @property
-    def brightness(self) -> int:
-        return ceil( (self._brightness - self._min_brightness)*(255-1)/(self._max_brightness - self._min_brightness)+1 )
+    def brightness(self) -> int | None:
+        if self._brightness is None:
+            return None
+        return self._brightness_map.to_ha(self._brightness)
 
     @property
     def color_temp(self) -> int:
-        return self.translate_mired(self._color_temp)
+        return self._color_temp_map.to_ha(self._color_temp)
         
     @property
     def min_mireds(self) -> int:
-        return self.translate_mired(self._max_color_temperature)
+        return self._color_temp_map.min_mireds
 
     @property
     def max_mireds(self) -> int:
-        return self.translate_mired(self._min_color_temperature)
-
-    @staticmethod
-    def translate_mired(num) -> int:
-        try:
-            return floor(1000000 / num)
-        except (TypeError, ValueError, ZeroDivisionError):
-            return 153
+        return self._color_temp_map.max_mireds
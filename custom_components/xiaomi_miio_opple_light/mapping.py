@@ -0,0 +1,78 @@
+"""Lookup tables between Home Assistant and lamp units."""
+from __future__ import annotations
+
+from math import floor
+
+
+def translate_mired(num) -> int:
+    """Convert between kelvin and mireds."""
+    try:
+        return floor(1000000 / num)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 153
+
+
+class BrightnessMap:
+    """HA brightness (0-255) <-> lamp brightness (min-max percent).
+
+    to_device rounds to the nearest lamp value and hits every lamp value
+    as long as the range spans at most 255 steps. to_ha maps each lamp
+    value to the middle of the HA values that produce it, so
+    to_device(to_ha(value)) == value and reading back a value set from HA
+    never changes the state HA shows.
+    """
+
+    def __init__(self, min_brightness: int, max_brightness: int) -> None:
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        span = max_brightness - min_brightness
+        # Integer round-half-up of (brightness - 1) * span / 254
+        self._to_device = [min_brightness] + [
+            min_brightness + ((brightness - 1) * span * 2 + 254) // (2 * 254)
+            for brightness in range(1, 256)
+        ]
+        sources = {}
+        for brightness in range(1, 256):
+            sources.setdefault(self._to_device[brightness], []).append(brightness)
+        self._to_ha = {}
+        for value in range(min_brightness, max_brightness + 1):
+            if value in sources:
+                self._to_ha[value] = sources[value][len(sources[value]) // 2]
+            else:
+                self._to_ha[value] = 1 + ((value - min_brightness) * 254 * 2 + span) // (2 * span)
+
+    def to_device(self, brightness: int) -> int:
+        return self._to_device[min(max(int(brightness), 0), 255)]
+
+    def to_ha(self, value: int) -> int:
+        return self._to_ha[min(max(value, self.min_brightness), self.max_brightness)]
+
+
+class ColorTempMap:
+    """Mireds <-> lamp color temperature (kelvin), clamped to the lamp range."""
+
+    def __init__(self, min_color_temperature: int, max_color_temperature: int) -> None:
+        self.min_color_temperature = min_color_temperature
+        self.max_color_temperature = max_color_temperature
+        self.min_mireds = translate_mired(max_color_temperature)
+        self.max_mireds = translate_mired(min_color_temperature)
+        self._to_device = {
+            mired: min(max(translate_mired(mired), min_color_temperature), max_color_temperature)
+            for mired in range(self.min_mireds, self.max_mireds + 1)
+        }
+        self._to_ha = {
+            kelvin: translate_mired(kelvin)
+            for kelvin in range(min_color_temperature, max_color_temperature + 1)
+        }
+
+    def to_device(self, mired: int) -> int:
+        kelvin = self._to_device.get(int(mired))
+        if kelvin is not None:
+            return kelvin
+        if mired < self.min_mireds:
+            return self.max_color_temperature
+        return self.min_color_temperature
+
+    def to_ha(self, kelvin: int) -> int:
+        mired = self._to_ha.get(kelvin)
+        return translate_mired(kelvin) if mired is None else mired
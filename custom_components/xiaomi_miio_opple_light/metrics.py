@@ -0,0 +1,104 @@
+"""Prometheus metrics for Opple lights.
+
+When prometheus_client is installed (the prometheus integration pulls it
+in), a collector is added to its default registry, so the metrics show up
+on Home Assistant's /api/prometheus endpoint next to the entity metrics.
+Values are read from the counters the integration keeps anyway, only when
+scraped. Scrapes run in the executor, so dicts the event loop may change
+are copied before iterating and looked up with get().
+"""
+from __future__ import annotations
+
+import logging
+
+try:
+    from prometheus_client import REGISTRY
+    from prometheus_client.core import (
+        CounterMetricFamily,
+        GaugeMetricFamily,
+        HistogramMetricFamily
+    )
+except ImportError:
+    REGISTRY = None
+
+from .protocol import RTT_BUCKETS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OppleCollector:
+
+    def __init__(self, coordinator) -> None:
+        self._coordinator = coordinator
+
+    def collect(self):
+        coordinator = self._coordinator
+        transport = coordinator.transport
+
+        requests = CounterMetricFamily(
+            'opple_miio_requests', 'miio requests sent', labels=['method'])
+        timeouts = CounterMetricFamily(
+            'opple_miio_timeouts', 'miio requests that timed out', labels=['method'])
+        errors = CounterMetricFamily(
+            'opple_miio_errors', 'miio requests answered with an error', labels=['method'])
+        durations = HistogramMetricFamily(
+            'opple_miio_request_duration_seconds', 'miio round trip time', labels=['method'])
+        for method, stats in list(transport.methods.items()):
+            requests.add_metric([method], stats.requests)
+            timeouts.add_metric([method], stats.timeouts)
+            errors.add_metric([method], stats.errors)
+            buckets = []
+            total = 0
+            for bound, count in zip(RTT_BUCKETS + (float('inf'),), stats.buckets):
+                total += count
+                buckets.append((str(bound) if bound != float('inf') else '+Inf', total))
+            durations.add_metric([method], buckets, stats.rtt_sum)
+        yield from (requests, timeouts, errors, durations)
+
+        limiter = transport.limiter
+        yield GaugeMetricFamily(
+            'opple_miio_request_queue_depth', 'miio requests waiting for a slot',
+            value=limiter.queued)
+        yield CounterMetricFamily(
+            'opple_miio_request_wait_seconds', 'Time spent waiting for a request slot',
+            value=limiter.wait_time)
+        detector = transport.blocking_detector
+        if detector is not None:
+            yield CounterMetricFamily(
+                'opple_loop_blocking_calls', 'Device calls that blocked the event loop too long',
+                value=detector.slow_calls)
+
+        poll_lag = GaugeMetricFamily(
+            'opple_poll_lag_seconds', 'How late the last poll started', labels=['host'])
+        poll_interval = GaugeMetricFamily(
+            'opple_poll_interval_seconds', 'Current adaptive poll interval', labels=['host'])
+        queue_depth = GaugeMetricFamily(
+            'opple_command_queue_depth', 'Writes queued or in flight', labels=['host'])
+        suppressed = CounterMetricFamily(
+            'opple_state_writes_suppressed', 'Polls that did not write state', labels=['host'])
+        available = GaugeMetricFamily(
+            'opple_lamp_available', 'Whether the circuit breaker is closed', labels=['host'])
+        poll_lags = dict(coordinator.poll_lag)
+        for host, entity in list(coordinator.entities.items()):
+            if poll_lags.get(host) is not None:
+                poll_lag.add_metric([host], poll_lags[host])
+            interval = coordinator.poll_interval(host)
+            if interval is not None:
+                poll_interval.add_metric([host], interval)
+            queue_depth.add_metric([host], entity.command_queue_depth)
+            suppressed.add_metric([host], entity.suppressed_writes)
+            available.add_metric([host], int(entity.available))
+        yield from (poll_lag, poll_interval, queue_depth, suppressed, available)
+
+
+def register(coordinator):
+    """Register a collector for coordinator, return a function removing it."""
+    if REGISTRY is None:
+        return lambda: None
+    collector = OppleCollector(coordinator)
+    try:
+        REGISTRY.register(collector)
+    except ValueError:
+        _LOGGER.warning('Opple metrics are already registered')
+        return lambda: None
+    return lambda: REGISTRY.unregister(collector)
@@ -0,0 +1,495 @@
+"""Asyncio miio transport for Opple lights."""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import collections
+import json
+import logging
+import socket
+import struct
+import time
+
+from miio.exceptions import DeviceError, DeviceException
+from miio.protocol import Utils
+
+_LOGGER = logging.getLogger(__name__)
+
+MIIO_PORT = 54321
+DEFAULT_TIMEOUT = 5
+DEFAULT_RETRIES = 1
+DEFAULT_MAX_PARALLEL_REQUESTS = 16
+RTT_SAMPLES = 256
+# Histogram bucket upper bounds in seconds, Prometheus style
+RTT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+MAGIC = 0x2131
+# magic, length, unknown, device id, timestamp; followed by a 16 byte checksum
+HEADER = struct.Struct(">HHIII")
+HELLO = bytes.fromhex("21310020" + "ff" * 28)
+
+
+def build_message(token: bytes, device_id: int, ts: int, payload: dict) -> bytes:
+    """Encrypt and frame a miio request or reply."""
+    data = Utils.encrypt(json.dumps(payload).encode("utf-8") + b"\x00", token)
+    header = HEADER.pack(MAGIC, 32 + len(data), 0, device_id, ts)
+    return header + Utils.md5(header + token + data) + data
+
+
+def parse_message(token: bytes, data: bytes) -> tuple[int, int, dict | None]:
+    """Return device id, timestamp and decrypted payload of a miio packet.
+
+    The payload is None for handshake (hello) packets.
+    """
+    if len(data) < 32:
+        raise DeviceException("Short miio packet: %d bytes" % len(data))
+    magic, length, _, device_id, ts = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise DeviceException("Bad miio magic: %#x" % magic)
+    payload = data[32:length]
+    if not payload:
+        return device_id, ts, None
+    if Utils.md5(data[:16] + token + payload) != data[16:32]:
+        raise DeviceException("Bad miio checksum")
+    decrypted = Utils.decrypt(payload, token).rstrip(b"\x00")
+    return device_id, ts, json.loads(decrypted)
+
+
+class RequestLimiter:
+    """Caps the number of miio requests in flight across all sessions.
+
+    Waiters are served in FIFO order. queued, requests, wait_time and
+    max_wait_time are kept for diagnostics.
+    """
+
+    def __init__(self, limit: int = DEFAULT_MAX_PARALLEL_REQUESTS) -> None:
+        self.limit = limit
+        self.active = 0
+        self.requests = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._waiters = collections.deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+        while self._waiters and self.active < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    async def __aenter__(self) -> None:
+        start = time.monotonic()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before the cancellation
+                    self._release()
+                elif future in self._waiters:
+                    self._waiters.remove(future)
+                raise
+        wait = time.monotonic() - start
+        self.requests += 1
+        self.wait_time += wait
+        self.max_wait_time = max(self.max_wait_time, wait)
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        if self.active <= self.limit:
+            while self._waiters:
+                future = self._waiters.popleft()
+                if not future.done():
+                    # Hand the slot over without decrementing active
+                    future.set_result(None)
+                    return
+        self.active -= 1
+
+
+class MethodStats:
+    """Counters and a round trip histogram of one miio method."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.buckets = [0] * (len(RTT_BUCKETS) + 1)
+        self.rtt_sum = 0.0
+
+    def record(self, rtt: float) -> None:
+        self.buckets[bisect.bisect_left(RTT_BUCKETS, rtt)] += 1
+        self.rtt_sum += rtt
+
+
+class SessionStats:
+    """Request counters and the most recent round trip times of a session.
+
+    Recording is O(1); percentiles are only computed when read.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.errors = 0
+        self.last_success = None
+        self.rtts = collections.deque(maxlen=RTT_SAMPLES)
+
+    def percentile(self, pct: float) -> float | None:
+        if not self.rtts:
+            return None
+        values = sorted(self.rtts)
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+    def as_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'errors': self.errors,
+            'last_success': self.last_success,
+            'rtt_p50': self.percentile(50),
+            'rtt_p95': self.percentile(95),
+            'rtt_p99': self.percentile(99),
+        }
+
+
+class _StepTimer:
+    """Drives a coroutine and times each step it runs on the loop thread.
+
+    A coroutine only holds the loop between two suspension points, so the
+    longest step is how long the call blocked everything else.
+    """
+
+    def __init__(self, coro) -> None:
+        self._coro = coro
+        self.total = 0.0
+        self.longest = 0.0
+
+    def __await__(self):
+        value = None
+        error = None
+        while True:
+            start = time.perf_counter()
+            try:
+                if error is None:
+                    future = self._coro.send(value)
+                else:
+                    future = self._coro.throw(error)
+            except StopIteration as stop:
+                self._record(time.perf_counter() - start)
+                return stop.value
+            except BaseException:
+                self._record(time.perf_counter() - start)
+                raise
+            self._record(time.perf_counter() - start)
+            try:
+                value = yield future
+                error = None
+            except BaseException as ex:
+                value = None
+                error = ex
+
+    def _record(self, elapsed: float) -> None:
+        self.total += elapsed
+        self.longest = max(self.longest, elapsed)
+
+
+class BlockingDetector:
+    """Warns when a device call holds the loop longer than threshold seconds.
+
+    Requests are timed step by step, received packets while they are
+    decrypted and dispatched.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self.calls = 0
+        self.slow_calls = 0
+        self.max_blocked = 0.0
+
+    async def run(self, coro, method: str, host: str):
+        timer = _StepTimer(coro)
+        try:
+            return await timer
+        finally:
+            self.record(method, host, timer.longest, timer.total)
+
+    def record(self, method: str, host: str, blocked: float, total: float | None = None) -> None:
+        self.calls += 1
+        self.max_blocked = max(self.max_blocked, blocked)
+        if blocked > self.threshold:
+            self.slow_calls += 1
+            _LOGGER.warning(
+                '%s to %s blocked the event loop for %.1f ms (%.1f ms in total)',
+                method, host, blocked * 1000, (blocked if total is None else total) * 1000
+            )
+
+
+class MiioSession:
+    """Handshake state and in-flight requests of a single device."""
+
+    def __init__(
+        self,
+        transport: MiioTransport,
+        host: str,
+        token: str,
+        port: int = MIIO_PORT
+    ) -> None:
+        self.host = host
+        self.port = port
+        # Resolved on first use; replies are routed by the address
+        self.addr = None
+        self._transport = transport
+        self.token = token
+        self._token = bytes.fromhex(token)
+        self._device_id = None
+        self._device_ts = 0
+        self._ts_received = 0.0
+        self._hello = None
+        self._pending = {}
+        self.handshakes = 0
+        # True while the stamp comes from restore() and the lamp hasn't answered yet
+        self.restored = False
+        self.stats = SessionStats()
+
+    @property
+    def stamp(self) -> tuple[int, int] | None:
+        """Return the device id and its current timestamp, if known."""
+        if self._device_id is None:
+            return None
+        return self._device_id, self._device_ts + int(time.monotonic() - self._ts_received)
+
+    def restore(self, device_id: int, device_ts: int) -> None:
+        """Skip the handshake by reusing a previously seen device stamp.
+
+        If the device has rebooted since, the first request times out and
+        the session falls back to a regular handshake; send() always allows
+        one retry for that while the stamp is unconfirmed.
+        """
+        if self._device_id is None:
+            self._device_id = device_id
+            self._device_ts = device_ts
+            self._ts_received = time.monotonic()
+            self.restored = True
+
+    async def send(
+        self,
+        method: str,
+        params: list | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES
+    ):
+        """Send a command and return its result."""
+        detector = self._transport.blocking_detector
+        if detector is not None:
+            return await detector.run(self._send(method, params, timeout, retries), method, self.host)
+        return await self._send(method, params, timeout, retries)
+
+    async def _send(self, method: str, params: list | None, timeout: float, retries: int):
+        await self._transport.async_connect()
+        if self.addr is None:
+            await self._resolve()
+        if self.restored:
+            retries = max(retries, 1)
+        for attempt in range(retries + 1):
+            if attempt:
+                self.stats.retries += 1
+            try:
+                async with self._transport.limiter:
+                    if self._device_id is None:
+                        await self._handshake(timeout)
+                    return await self._request(method, params or [], timeout)
+            except asyncio.TimeoutError:
+                # Redo the handshake on the next attempt, the device may
+                # have rebooted and reset its stamp.
+                self._device_id = None
+                self.restored = False
+                self.stats.timeouts += 1
+                _LOGGER.debug('%s: %s timed out (attempt %d)', self.host, method, attempt + 1)
+        raise DeviceException("Unable to talk to %s: %s timed out" % (self.host, method))
+
+    async def _resolve(self) -> None:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                self.host, self.port, family=socket.AF_INET, type=socket.SOCK_DGRAM
+            )
+        except OSError as ex:
+            raise DeviceException("Unable to resolve %s: %s" % (self.host, ex)) from ex
+        self.addr = infos[0][4][:2]
+        self._transport.add_route(self)
+
+    async def _handshake(self, timeout: float) -> None:
+        if self._hello is None or self._hello.done():
+            self._hello = asyncio.get_running_loop().create_future()
+        self._transport.sendto(HELLO, self.addr)
+        await asyncio.wait_for(asyncio.shield(self._hello), timeout)
+
+    async def _request(self, method: str, params: list, timeout: float):
+        request_id = self._transport.next_request_id()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        ts = self._device_ts + int(time.monotonic() - self._ts_received) + 1
+        payload = {"id": request_id, "method": method, "params": params}
+        method_stats = self._transport.method_stats(method)
+        method_stats.requests += 1
+        self.stats.requests += 1
+        start = time.monotonic()
+        try:
+            self._transport.sendto(
+                build_message(self._token, self._device_id, ts, payload), self.addr
+            )
+            reply = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            method_stats.timeouts += 1
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+        rtt = time.monotonic() - start
+        method_stats.record(rtt)
+        self.stats.rtts.append(rtt)
+        if "error" in reply:
+            method_stats.errors += 1
+            self.stats.errors += 1
+            raise DeviceError(reply["error"])
+        self.stats.last_success = time.time()
+        return reply.get("result")
+
+    def close(self) -> None:
+        """Stop receiving replies, e.g. for a session only used for a probe."""
+        self._transport.remove_route(self)
+
+    def datagram_received(self, data: bytes) -> bool:
+        """Handle a packet, return whether it was a reply for this session."""
+        detector = self._transport.blocking_detector
+        if detector is None:
+            return self._datagram_received(data)
+        start = time.perf_counter()
+        handled = self._datagram_received(data)
+        detector.record('reply', self.host, time.perf_counter() - start)
+        return handled
+
+    def _datagram_received(self, data: bytes) -> bool:
+        try:
+            device_id, ts, payload = parse_message(self._token, data)
+        except (DeviceException, ValueError) as ex:
+            _LOGGER.debug('%s: dropping packet: %s', self.host, ex)
+            return False
+        self._device_id = device_id
+        self._device_ts = ts
+        self._ts_received = time.monotonic()
+        self.restored = False
+        if payload is None:
+            if self._hello is not None and not self._hello.done():
+                self.handshakes += 1
+                self._hello.set_result(None)
+                if self._transport.on_handshake is not None:
+                    self._transport.on_handshake(self)
+            # Hello replies carry no checksum; every session of the address gets them
+            return False
+        future = self._pending.get(payload.get("id"))
+        if future is None:
+            return False
+        if not future.done():
+            future.set_result(payload)
+        return True
+
+
+class MiioTransport(asyncio.DatagramProtocol):
+    """One UDP socket shared by every session, replies routed by address.
+
+    Sessions are looked up by the configured host and token, replies by
+    the resolved address they come from. Sessions with different tokens
+    for one address can coexist; a reply goes to the one whose token
+    verifies its checksum.
+    """
+
+    def __init__(self) -> None:
+        self._transport = None
+        self._lock = asyncio.Lock()
+        self._sessions = {}
+        self._routes = {}
+        # Shared by all sessions, so sessions of one address never reuse an id
+        self._request_id = 0
+        self.limiter = RequestLimiter()
+        self.methods = {}
+        self.blocking_detector = None
+        # Called with the session after every completed handshake
+        self.on_handshake = None
+
+    def session(self, host: str, token: str, port: int = MIIO_PORT) -> MiioSession:
+        """Return the session for a device, creating it if needed."""
+        session = self._sessions.get((host, port, token))
+        if session is None:
+            session = self._sessions[(host, port, token)] = MiioSession(self, host, token, port)
+        return session
+
+    def next_request_id(self) -> int:
+        self._request_id = self._request_id % 9999 + 1
+        return self._request_id
+
+    def add_route(self, session: MiioSession) -> None:
+        sessions = self._routes.setdefault(session.addr, [])
+        if session not in sessions:
+            sessions.append(session)
+
+    def remove_route(self, session: MiioSession) -> None:
+        sessions = self._routes.get(session.addr, [])
+        if session in sessions:
+            sessions.remove(session)
+            if not sessions:
+                del self._routes[session.addr]
+
+    def detect_blocking(self, threshold: float) -> None:
+        """Time every request on the loop thread, warn above threshold seconds."""
+        if self.blocking_detector is None:
+            self.blocking_detector = BlockingDetector(threshold)
+        else:
+            self.blocking_detector.threshold = min(self.blocking_detector.threshold, threshold)
+
+    def method_stats(self, method: str) -> MethodStats:
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        return stats
+
+    async def async_connect(self) -> None:
+        if self._transport is not None:
+            return
+        async with self._lock:
+            if self._transport is None:
+                await asyncio.get_running_loop().create_datagram_endpoint(
+                    lambda: self, family=socket.AF_INET
+                )
+
+    def sendto(self, data: bytes, addr: tuple[str, int]) -> None:
+        self._transport.sendto(data, addr)
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+    def connection_lost(self, exc) -> None:
+        self._transport = None
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        for session in list(self._routes.get(addr[:2], ())):
+            if session.datagram_received(data):
+                break
+
+    def error_received(self, exc) -> None:
+        _LOGGER.debug('Socket error: %s', exc)
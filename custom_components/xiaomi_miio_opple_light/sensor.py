@@ -0,0 +1,91 @@
+"""Diagnostic sensors for Opple lights."""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_TOKEN, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .coordinator import async_get_coordinator
+from .protocol import SessionStats
+
+
+def _ms(value: float | None) -> float | None:
+    return None if value is None else round(value * 1000, 1)
+
+
+def _timestamp(value: float | None) -> datetime | None:
+    return None if value is None else datetime.fromtimestamp(value, timezone.utc)
+
+
+# key, name, unit, device class, state class, value
+SENSORS = (
+    ('rtt_p50', 'Latency p50', UnitOfTime.MILLISECONDS, SensorDeviceClass.DURATION,
+        SensorStateClass.MEASUREMENT, lambda stats: _ms(stats.percentile(50))),
+    ('rtt_p95', 'Latency p95', UnitOfTime.MILLISECONDS, SensorDeviceClass.DURATION,
+        SensorStateClass.MEASUREMENT, lambda stats: _ms(stats.percentile(95))),
+    ('rtt_p99', 'Latency p99', UnitOfTime.MILLISECONDS, SensorDeviceClass.DURATION,
+        SensorStateClass.MEASUREMENT, lambda stats: _ms(stats.percentile(99))),
+    ('timeouts', 'Timeouts', None, None,
+        SensorStateClass.TOTAL_INCREASING, lambda stats: stats.timeouts),
+    ('retries', 'Retries', None, None,
+        SensorStateClass.TOTAL_INCREASING, lambda stats: stats.retries),
+    ('last_success', 'Last success', None, SensorDeviceClass.TIMESTAMP,
+        None, lambda stats: _timestamp(stats.last_success)),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback
+) -> None:
+    coordinator = await async_get_coordinator(hass)
+    # Not coordinator.session(), which would put a stored stamp back
+    device = coordinator.transport.session(entry.data[CONF_HOST], entry.data[CONF_TOKEN])
+    async_add_entities(
+        OppleDiagnosticSensor(entry, device.stats, *sensor) for sensor in SENSORS
+    )
+
+
+class OppleDiagnosticSensor(SensorEntity):
+    """Reads one value from the session statistics of a lamp.
+
+    Reading only touches counters kept by the transport anyway, so the
+    default sensor polling adds no network traffic.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+        self,
+        entry: ConfigEntry,
+        stats: SessionStats,
+        key: str,
+        name: str,
+        unit: str | None,
+        device_class: SensorDeviceClass | None,
+        state_class: SensorStateClass | None,
+        value
+    ) -> None:
+        self._stats = stats
+        self._value = value
+        self._attr_name = "{} {}".format(entry.title, name)
+        self._attr_unique_id = "{}-{}".format(entry.unique_id, key)
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        self._attr_state_class = state_class
+        self._attr_device_info = {'identifiers': {(DOMAIN, entry.unique_id)}}
+
+    @property
+    def native_value(self):
+        return self._value(self._stats)
@@ -0,0 +1,98 @@
+"""Tests for the shared poll scheduling of OppleCoordinator."""
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+pytest.importorskip("miio")
+
+from custom_components.xiaomi_miio_opple_light import coordinator as coordinator_module  # noqa: E402
+
+
+class FakeEntity:
+    """Counts polls and holds each one until release is set."""
+
+    def __init__(self) -> None:
+        self.polls = 0
+        self.release = asyncio.Event()
+        self.breaker = SimpleNamespace(is_open=False)
+
+    async def async_schedule_update(self) -> bool:
+        self.polls += 1
+        await self.release.wait()
+        return False
+
+
+class FakeHass:
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+
+    def async_create_task(self, target):
+        return self.loop.create_task(target)
+
+
+def _coordinator(monkeypatch):
+    monkeypatch.setattr(coordinator_module, "Store", lambda *args: None)
+    monkeypatch.setattr(
+        coordinator_module, "async_track_time_interval", lambda *args: lambda: None
+    )
+    coordinator = coordinator_module.OppleCoordinator(FakeHass())
+    entity = FakeEntity()
+    coordinator.async_add("lamp", entity, timedelta(seconds=10), timedelta(seconds=60))
+    return coordinator, entity
+
+
+async def _until(condition) -> None:
+    while not condition():
+        await asyncio.sleep(0)
+
+
+def test_verify_during_poll_polls_again_afterwards(monkeypatch):
+    async def run():
+        coordinator, entity = _coordinator(monkeypatch)
+        coordinator._async_start_poll("lamp")
+        await _until(lambda: entity.polls)
+        coordinator._async_verify_now("lamp")
+        assert entity.polls == 1
+        entity.release.set()
+        await asyncio.wait_for(_until(lambda: entity.polls == 2), 1)
+        await _until(lambda: "lamp" not in coordinator._polling)
+        assert entity.polls == 2
+        coordinator.async_shutdown()
+
+    asyncio.run(run())
+
+
+class FakeSession:
+
+    host = "192.168.1.10"
+
+    def __init__(self, token, mac) -> None:
+        self.token = token
+        self.mac = mac
+        self.sent = 0
+
+    async def send(self, method, params=None, timeout=None, retries=None):
+        self.sent += 1
+        return {"model": "opple.light.bydceiling", "mac": self.mac}
+
+
+def test_device_info_is_not_shared_between_tokens(monkeypatch):
+    async def run():
+        coordinator, _ = _coordinator(monkeypatch)
+        coordinator._devices_store = SimpleNamespace(async_delay_save=lambda *args: None)
+        coordinator._devices = {}
+        first = FakeSession("0" * 32, "00:00:00:00:00:01")
+        other = FakeSession("1" * 32, "00:00:00:00:00:02")
+        assert (await coordinator.async_device_info(first, 1))["mac"] == first.mac
+        assert (await coordinator.async_device_info(first, 1))["mac"] == first.mac
+        assert first.sent == 1
+        assert (await coordinator.async_device_info(other, 1))["mac"] == other.mac
+        assert other.sent == 1
+        coordinator.async_shutdown()
+
+    asyncio.run(run())
@@ -0,0 +1,119 @@
+"""Tests for write coalescing and transitions of OppleLight."""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("homeassistant")
+pytest.importorskip("miio")
+
+from custom_components.xiaomi_miio_opple_light.const import DATA_KEY  # noqa: E402
+from custom_components.xiaomi_miio_opple_light.light import OppleLight  # noqa: E402
+
+
+class FakeSession:
+    """Records writes and holds each reply until release is set."""
+
+    host = "127.0.0.1"
+
+    def __init__(self) -> None:
+        self.sent = []
+        self.release = asyncio.Event()
+
+    async def send(self, method, params=None, timeout=None, retries=None):
+        self.sent.append((method, list(params or [])))
+        await self.release.wait()
+        return ["ok"]
+
+
+class FakeCoordinator:
+
+    def __init__(self) -> None:
+        self.boosts = 0
+
+    def async_boost(self, host) -> None:
+        self.boosts += 1
+
+    def async_verify(self, host, delay) -> None:
+        pass
+
+
+class FakeHass:
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.data = {DATA_KEY: FakeCoordinator()}
+
+    def async_create_task(self, target):
+        return self.loop.create_task(target)
+
+
+def _entity() -> tuple:
+    hass = FakeHass()
+    device = FakeSession()
+    entity = OppleLight(
+        hass, "lamp", device, {"model": "opple.light.bydceiling", "mac": "00:00:00:00:00:01"},
+        timedelta(seconds=10), timedelta(seconds=60), 1.5, 1, 5, 2, False, None,
+        7, 100, 3000, 5700
+    )
+    entity.async_schedule_update_ha_state = lambda force_refresh=False: None
+    return entity, device, hass.data[DATA_KEY]
+
+
+async def _until(condition) -> None:
+    while not condition():
+        await asyncio.sleep(0)
+
+
+def test_cancelled_write_hands_over_merged_write():
+    async def run():
+        entity, device, _ = _entity()
+        first = asyncio.create_task(entity.change_state("SetBrightness", [10], "_brightness", 10))
+        await _until(lambda: device.sent)
+        step = asyncio.create_task(entity.change_state("SetBrightness", [20], "_brightness", 20))
+        await asyncio.sleep(0)
+        newer = asyncio.create_task(entity.change_state("SetBrightness", [30], "_brightness", 30))
+        await asyncio.sleep(0)
+        step.cancel()
+        device.release.set()
+        assert await first is True
+        assert await newer is True
+        with pytest.raises(asyncio.CancelledError):
+            await step
+        assert device.sent == [("SetBrightness", [10]), ("SetBrightness", [30])]
+        assert entity._brightness == 30
+
+    asyncio.run(run())
+
+
+def test_cancelled_write_is_dropped_while_queued():
+    async def run():
+        entity, device, _ = _entity()
+        first = asyncio.create_task(entity.change_state("SetBrightness", [10], "_brightness", 10))
+        await _until(lambda: device.sent)
+        step = asyncio.create_task(entity.change_state("SetBrightness", [20], "_brightness", 20))
+        await asyncio.sleep(0)
+        step.cancel()
+        device.release.set()
+        assert await first is True
+        with pytest.raises(asyncio.CancelledError):
+            await step
+        await asyncio.sleep(0)
+        assert device.sent == [("SetBrightness", [10])]
+        assert entity.command_queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_transition_without_ramp_targets_returns_after_other_commands():
+    async def run():
+        entity, device, coordinator = _entity()
+        device.release.set()
+        start = time.monotonic()
+        await entity._async_transition(2, [("SetState", [True], "_state", True)])
+        assert time.monotonic() - start < 1
+        assert device.sent == [("SetState", [True])]
+        assert coordinator.boosts == 1
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+"""Tests for the brightness and color temperature lookup tables."""
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+# Load mapping.py by path; importing the package would pull in Home Assistant.
+_spec = importlib.util.spec_from_file_location(
+    "opple_mapping",
+    Path(__file__).resolve().parent.parent
+    / "custom_components" / "xiaomi_miio_opple_light" / "mapping.py",
+)
+mapping = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(mapping)
+
+RANGES = [(7, 100), (1, 100), (0, 100), (0, 254), (1, 255), (10, 20), (50, 51), (99, 100), (3, 200)]
+
+
+@pytest.mark.parametrize("min_brightness,max_brightness", RANGES)
+def test_lamp_value_round_trip(min_brightness, max_brightness):
+    brightness_map = mapping.BrightnessMap(min_brightness, max_brightness)
+    for value in range(min_brightness, max_brightness + 1):
+        assert brightness_map.to_device(brightness_map.to_ha(value)) == value
+
+
+@pytest.mark.parametrize("min_brightness,max_brightness", RANGES + [(1, 1000)])
+def test_ha_value_round_trip(min_brightness, max_brightness):
+    brightness_map = mapping.BrightnessMap(min_brightness, max_brightness)
+    for brightness in range(1, 256):
+        value = brightness_map.to_device(brightness)
+        assert min_brightness <= value <= max_brightness
+        assert brightness_map.to_device(brightness_map.to_ha(value)) == value
+
+
+@pytest.mark.parametrize("min_brightness,max_brightness", RANGES)
+def test_brightness_is_monotonic_and_covers_range(min_brightness, max_brightness):
+    brightness_map = mapping.BrightnessMap(min_brightness, max_brightness)
+    values = [brightness_map.to_device(brightness) for brightness in range(1, 256)]
+    assert values == sorted(values)
+    assert values[0] == min_brightness
+    assert values[-1] == max_brightness
+    assert set(values) == set(range(min_brightness, max_brightness + 1))
+    ha_values = [brightness_map.to_ha(value) for value in range(min_brightness, max_brightness + 1)]
+    assert ha_values == sorted(ha_values)
+    assert all(1 <= brightness <= 255 for brightness in ha_values)
+
+
+def test_brightness_clamps_out_of_range_values():
+    brightness_map = mapping.BrightnessMap(7, 100)
+    assert brightness_map.to_device(0) == 7
+    assert brightness_map.to_device(300) == 100
+    assert brightness_map.to_ha(3) == brightness_map.to_ha(7)
+    assert brightness_map.to_ha(120) == brightness_map.to_ha(100)
+
+
+@pytest.mark.parametrize("min_kelvin,max_kelvin", [(3000, 5700), (2700, 6500), (4000, 4001)])
+def test_color_temp_round_trip(min_kelvin, max_kelvin):
+    color_temp_map = mapping.ColorTempMap(min_kelvin, max_kelvin)
+    for mired in range(color_temp_map.min_mireds, color_temp_map.max_mireds + 1):
+        kelvin = color_temp_map.to_device(mired)
+        assert min_kelvin <= kelvin <= max_kelvin
+        assert color_temp_map.to_device(color_temp_map.to_ha(kelvin)) == kelvin
+
+
+def test_color_temp_clamps_out_of_range_mireds():
+    color_temp_map = mapping.ColorTempMap(3000, 5700)
+    assert color_temp_map.to_device(1) == 5700
+    assert color_temp_map.to_device(1000) == 3000
@@ -0,0 +1,376 @@
+"""Benchmark the miio transport and the light platform against fake lamps.
+
+Measures, for each lamp count: startup (concurrent miIO.info and
+SyncBaseInfo probe of every lamp on a fresh transport), poll throughput,
+turn-on latency percentiles (SetState, SetBrightness and
+SetColorTemperature pipelined per lamp) and event loop lag while doing so.
+
+When Home Assistant is installed, the same is measured through the
+integration itself under "entity": lamp setup (cold, and warm with the
+stamps and device info saved by the cold run), polls through the
+coordinator and OppleLight.async_turn_on, so the coordinator, write
+coalescing, mapping and state write paths are covered too. A minimal hass
+stub stands in for Home Assistant; stored data is kept in memory and state
+writes are only counted.
+
+    python tools/benchmark.py --counts 1 10 100 500 --output bench.json
+
+The fake lamps run on their own event loop in a separate thread so they
+don't distort the loop lag numbers.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_lamp import DEFAULT_FIRST_HOST, DEFAULT_TOKEN, async_start_lamps, protocol  # noqa: E402
+
+try:
+    from homeassistant.components.light import ATTR_BRIGHTNESS, ATTR_COLOR_TEMP
+    from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PLATFORM, CONF_TOKEN
+
+    from custom_components.xiaomi_miio_opple_light import (
+        const as opple_const,
+        coordinator as opple_coordinator,
+        light as opple_light
+    )
+except ImportError:
+    opple_light = None
+
+LAG_PROBE_INTERVAL = 0.01
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class LoopLagMonitor:
+    """Records how late a periodic sleep wakes up, i.e. loop blocking."""
+
+    def __init__(self) -> None:
+        self.lags = []
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            self.lags.append(time.perf_counter() - start - LAG_PROBE_INTERVAL)
+
+    def __enter__(self) -> LoopLagMonitor:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._task.cancel()
+
+    def summary(self) -> dict:
+        if not self.lags:
+            return {"max_ms": 0.0, "p99_ms": 0.0}
+        return {
+            "max_ms": max(self.lags) * 1000,
+            "p99_ms": percentile(self.lags, 99) * 1000,
+        }
+
+
+class LampServer:
+    """Fake lamps on a background event loop."""
+
+    def __init__(self, count: int, **kwargs) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.lamps = asyncio.run_coroutine_threadsafe(
+            async_start_lamps(count, **kwargs), self.loop
+        ).result()
+
+    def close(self) -> None:
+        async def _close() -> None:
+            for _, transport in self.lamps:
+                transport.close()
+            # Let the transports release their sockets before stopping
+            await asyncio.sleep(0)
+
+        asyncio.run_coroutine_threadsafe(_close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+async def bench_startup(hosts: list[str], token: str) -> dict:
+    transport = protocol.MiioTransport()
+    start = time.perf_counter()
+    with LoopLagMonitor() as lag:
+        await asyncio.gather(*(
+            asyncio.gather(session.send("miIO.info"), session.send("SyncBaseInfo"))
+            for session in (transport.session(host, token) for host in hosts)
+        ))
+    elapsed = time.perf_counter() - start
+    transport.close()
+    return {"seconds": elapsed, "loop_lag": lag.summary()}
+
+
+async def bench_polls(sessions: list, duration: float) -> dict:
+    polls = 0
+    deadline = time.perf_counter() + duration
+
+    async def _poll(session) -> None:
+        nonlocal polls
+        while time.perf_counter() < deadline:
+            await session.send("SyncBaseInfo")
+            polls += 1
+
+    with LoopLagMonitor() as lag:
+        await asyncio.gather(*(_poll(session) for session in sessions))
+    return {"polls_per_second": polls / duration, "loop_lag": lag.summary()}
+
+
+async def bench_turn_on(sessions: list, rounds: int) -> dict:
+    latencies = []
+
+    async def _turn_on(session, brightness: int) -> None:
+        start = time.perf_counter()
+        await asyncio.gather(
+            session.send("SetState", [True]),
+            session.send("SetBrightness", [brightness]),
+            session.send("SetColorTemperature", [4000]),
+        )
+        latencies.append(time.perf_counter() - start)
+
+    with LoopLagMonitor() as lag:
+        for index in range(rounds):
+            await asyncio.gather(*(_turn_on(session, 10 + index % 90) for session in sessions))
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "loop_lag": lag.summary(),
+    }
+
+
+class MemoryStore:
+    """Stands in for homeassistant.helpers.storage.Store."""
+
+    def __init__(self) -> None:
+        self.data = None
+
+    async def async_load(self):
+        return self.data
+
+    def async_delay_save(self, data_func, delay: float = 0) -> None:
+        self.data = data_func()
+
+
+class HassStub:
+    """The parts of HomeAssistant used by the coordinator and OppleLight."""
+
+    def __init__(self, stores: dict | None = None) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+        self.stores = stores if stores is not None else {}
+        self.state_writes = 0
+        # set_group is not benchmarked, so pretend it is registered
+        self.services = SimpleNamespace(has_service=lambda domain, service: True)
+
+    def async_create_task(self, target):
+        return self.loop.create_task(target)
+
+
+def _count_state_write(entity, force_refresh: bool = False) -> None:
+    entity.hass.state_writes += 1
+
+
+async def _async_setup_entities(hass: HassStub, hosts: list[str], args: argparse.Namespace) -> list:
+    coordinator = hass.data[opple_const.DATA_KEY] = opple_coordinator.OppleCoordinator(hass)
+    # Polls are driven by the benchmark instead of the 1 s tick
+    coordinator._remove_tick = lambda: None
+    entities = []
+    await asyncio.gather(*(
+        opple_light._async_setup_lamp(
+            hass,
+            opple_light.PLATFORM_SCHEMA({
+                CONF_PLATFORM: opple_const.DOMAIN,
+                CONF_NAME: host,
+                CONF_HOST: host,
+                CONF_TOKEN: DEFAULT_TOKEN,
+                opple_const.CONF_MAX_PARALLEL_REQUESTS: args.max_parallel_requests,
+            }),
+            entities.extend
+        )
+        for host in hosts
+    ))
+    for entity in entities:
+        await entity.async_added_to_hass()
+    return entities
+
+
+async def bench_entities(hosts: list[str], args: argparse.Namespace) -> dict:
+    # Keep storage in memory and count state writes instead of doing them
+    opple_coordinator.Store = lambda hass, version, key: hass.stores.setdefault(key, MemoryStore())
+    opple_light.OppleLight.async_schedule_update_ha_state = _count_state_write
+    result = {}
+
+    hass = HassStub()
+    start = time.perf_counter()
+    with LoopLagMonitor() as lag:
+        await _async_setup_entities(hass, hosts, args)
+    result["startup_cold"] = {"seconds": time.perf_counter() - start, "loop_lag": lag.summary()}
+    hass.data[opple_const.DATA_KEY].async_shutdown()
+
+    hass = HassStub(hass.stores)
+    start = time.perf_counter()
+    with LoopLagMonitor() as lag:
+        entities = await _async_setup_entities(hass, hosts, args)
+    result["startup_warm"] = {"seconds": time.perf_counter() - start, "loop_lag": lag.summary()}
+    coordinator = hass.data[opple_const.DATA_KEY]
+
+    polls = 0
+    deadline = time.perf_counter() + args.duration
+    hass.state_writes = 0
+    with LoopLagMonitor() as lag:
+        while time.perf_counter() < deadline:
+            await asyncio.gather(*(coordinator._async_poll(host) for host in hosts))
+            polls += len(hosts)
+    result["poll"] = {
+        "polls_per_second": polls / args.duration,
+        "state_writes": hass.state_writes,
+        "suppressed_writes": sum(entity.suppressed_writes for entity in entities),
+        "loop_lag": lag.summary(),
+    }
+
+    latencies = []
+
+    async def _turn_on(entity, brightness: int) -> None:
+        start = time.perf_counter()
+        await entity.async_turn_on(**{ATTR_BRIGHTNESS: brightness, ATTR_COLOR_TEMP: 250})
+        latencies.append(time.perf_counter() - start)
+
+    with LoopLagMonitor() as lag:
+        for index in range(args.rounds):
+            await asyncio.gather(*(_turn_on(entity, 1 + index * 13 % 255) for entity in entities))
+    result["turn_on"] = {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "loop_lag": lag.summary(),
+    }
+    for entity in entities:
+        await entity.async_will_remove_from_hass()
+    coordinator.async_shutdown()
+    return result
+
+
+async def bench(count: int, args: argparse.Namespace) -> dict:
+    server = LampServer(
+        count,
+        first_host=args.first_host,
+        token=DEFAULT_TOKEN,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        loss=args.loss,
+    )
+    try:
+        hosts = [lamp.host for lamp, _ in server.lamps]
+        result = {"lamps": count}
+        result["startup"] = await bench_startup(hosts, DEFAULT_TOKEN)
+        transport = protocol.MiioTransport()
+        transport.limiter.set_limit(args.max_parallel_requests)
+        sessions = [transport.session(host, DEFAULT_TOKEN) for host in hosts]
+        result["poll"] = await bench_polls(sessions, args.duration)
+        result["turn_on"] = await bench_turn_on(sessions, args.rounds)
+        result["limiter"] = {
+            "requests": transport.limiter.requests,
+            "max_wait_ms": transport.limiter.max_wait_time * 1000,
+        }
+        transport.close()
+        if opple_light is not None:
+            result["entity"] = await bench_entities(hosts, args)
+        return result
+    finally:
+        server.close()
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    if opple_light is None:
+        print("Home Assistant is not installed, skipping the entity benchmarks", file=sys.stderr)
+    report = {
+        "python": platform.python_version(),
+        "settings": {
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "loss": args.loss,
+            "duration": args.duration,
+            "rounds": args.rounds,
+            "max_parallel_requests": args.max_parallel_requests,
+        },
+        "results": [],
+    }
+    for count in args.counts:
+        result = await bench(count, args)
+        print(
+            "%4d lamps: startup %.3f s, %.0f polls/s, turn_on p50 %.1f ms p99 %.1f ms, "
+            "max loop lag %.1f ms" % (
+                count,
+                result["startup"]["seconds"],
+                result["poll"]["polls_per_second"],
+                result["turn_on"]["p50_ms"],
+                result["turn_on"]["p99_ms"],
+                max(result[key]["loop_lag"]["max_ms"] for key in ("startup", "poll", "turn_on")),
+            ),
+            file=sys.stderr,
+        )
+        if "entity" in result:
+            entity = result["entity"]
+            print(
+                "%4d lamps through OppleLight: startup cold %.3f s warm %.3f s, %.0f polls/s, "
+                "turn_on p50 %.1f ms p99 %.1f ms" % (
+                    count,
+                    entity["startup_cold"]["seconds"],
+                    entity["startup_warm"]["seconds"],
+                    entity["poll"]["polls_per_second"],
+                    entity["turn_on"]["p50_ms"],
+                    entity["turn_on"]["p99_ms"],
+                ),
+                file=sys.stderr,
+            )
+        report["results"].append(result)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--first-host", default=DEFAULT_FIRST_HOST)
+    parser.add_argument("--latency", type=float, default=5, help="milliseconds")
+    parser.add_argument("--jitter", type=float, default=1, help="milliseconds")
+    parser.add_argument("--loss", type=float, default=0)
+    parser.add_argument("--duration", type=float, default=5, help="seconds of polling")
+    parser.add_argument("--rounds", type=int, default=20, help="turn_on rounds")
+    parser.add_argument(
+        "--max-parallel-requests", type=int, default=protocol.DEFAULT_MAX_PARALLEL_REQUESTS
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    report = asyncio.run(_main(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Fake Opple lamps speaking miio over local UDP.
+
+Every lamp binds its own loopback address (127.0.0.0/8 is routed to lo on
+Linux), so hundreds of them can run side by side on the standard miio port:
+
+    python tools/fake_lamp.py --count 200 --latency 20 --loss 0.01
+
+A platform config for Home Assistant is printed on startup.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import ipaddress
+import logging
+import random
+import time
+from pathlib import Path
+
+# Load protocol.py by path; importing the package would pull in Home Assistant.
+_spec = importlib.util.spec_from_file_location(
+    "opple_protocol",
+    Path(__file__).resolve().parent.parent
+    / "custom_components" / "xiaomi_miio_opple_light" / "protocol.py",
+)
+protocol = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(protocol)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TOKEN = "00112233445566778899aabbccddeeff"
+DEFAULT_FIRST_HOST = "127.0.1.1"
+# Requests whose timestamp is further off the lamp's clock are dropped
+STAMP_TOLERANCE = 10
+
+
+class FakeLamp(asyncio.DatagramProtocol):
+    """One simulated lamp.
+
+    latency and jitter are in seconds, loss is the probability of dropping
+    a request or its reply, fail_rate the probability of a non-ok reply to
+    a write. Brightness below brightness_floor is clamped, as some firmware
+    does. Like real lamps, requests for another device id or with a stale
+    timestamp are ignored; reboot() resets the clock, so a client reusing
+    an old handshake has to redo it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        token: str = DEFAULT_TOKEN,
+        device_id: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        fail_rate: float = 0.0,
+        brightness_floor: int = 7,
+        model: str = "opple.light.bydceiling",
+        fw_ver: str = "2.0.8_0009"
+    ) -> None:
+        self.host = host
+        self.token = token
+        self.device_id = device_id
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.fail_rate = fail_rate
+        self.brightness_floor = brightness_floor
+        self.model = model
+        self.fw_ver = fw_ver
+        self.state = [False, 4000, 50]
+        self.requests = 0
+        self._token = bytes.fromhex(token)
+        self._started = time.monotonic()
+        self._boot_ts = random.randint(1000, 1 << 20)
+        self._transport = None
+
+    @property
+    def timestamp(self) -> int:
+        return self._boot_ts + int(time.monotonic() - self._started)
+
+    def reboot(self) -> None:
+        self._started = time.monotonic()
+        self._boot_ts = random.randint(1000, 1 << 20)
+
+    @property
+    def mac(self) -> str:
+        return "54:48:e6:%02x:%02x:%02x" % tuple(self.device_id.to_bytes(3, "big"))
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if random.random() < self.loss:
+            return
+        ts = self.timestamp
+        if data == protocol.HELLO:
+            reply = protocol.HEADER.pack(protocol.MAGIC, 32, 0, self.device_id, ts) + b"\xff" * 16
+        else:
+            try:
+                device_id, request_ts, request = protocol.parse_message(self._token, data)
+            except Exception as ex:
+                _LOGGER.debug("%s: bad packet from %s: %s", self.host, addr, ex)
+                return
+            if device_id != self.device_id or abs(request_ts - ts) > STAMP_TOLERANCE:
+                _LOGGER.debug("%s: stale stamp %d/%d from %s", self.host, device_id, request_ts, addr)
+                return
+            self.requests += 1
+            reply = protocol.build_message(
+                self._token, self.device_id, ts, self.handle(request)
+            )
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if random.random() < self.loss:
+            return
+        asyncio.get_running_loop().call_later(delay, self._transport.sendto, reply, addr)
+
+    def handle(self, request: dict) -> dict:
+        method = request.get("method")
+        params = request.get("params") or []
+        reply = {"id": request.get("id")}
+        write = method in ("SetState", "SetBrightness", "SetColorTemperature")
+        if write and random.random() < self.fail_rate:
+            reply["result"] = ["error"]
+        elif method == "miIO.info":
+            reply["result"] = {
+                "model": self.model,
+                "mac": self.mac,
+                "fw_ver": self.fw_ver,
+                "hw_ver": "MW300",
+            }
+        elif method == "SyncBaseInfo":
+            reply["result"] = list(self.state)
+        elif method == "SetState":
+            self.state[0] = bool(params[0])
+            reply["result"] = ["ok"]
+        elif method == "SetColorTemperature":
+            self.state[1] = min(max(int(params[0]), 3000), 5700)
+            reply["result"] = ["ok"]
+        elif method == "SetBrightness":
+            self.state[2] = min(max(int(params[0]), self.brightness_floor), 100)
+            reply["result"] = ["ok"]
+        else:
+            reply["error"] = {"code": -32601, "message": "Method not found."}
+        return reply
+
+
+async def async_start_lamps(
+    count: int,
+    first_host: str = DEFAULT_FIRST_HOST,
+    port: int = protocol.MIIO_PORT,
+    **kwargs
+) -> list[tuple[FakeLamp, asyncio.DatagramTransport]]:
+    """Start count lamps on consecutive loopback addresses."""
+    loop = asyncio.get_running_loop()
+    first = ipaddress.IPv4Address(first_host)
+    lamps = []
+    for index in range(count):
+        host = str(first + index)
+        transport, lamp = await loop.create_datagram_endpoint(
+            lambda host=host, index=index: FakeLamp(host, device_id=index + 1, **kwargs),
+            local_addr=(host, port),
+        )
+        lamps.append((lamp, transport))
+    return lamps
+
+
+async def _main(args: argparse.Namespace) -> None:
+    lamps = await async_start_lamps(
+        args.count,
+        args.first_host,
+        args.port,
+        token=args.token,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        loss=args.loss,
+        fail_rate=args.fail_rate,
+        brightness_floor=args.brightness_floor,
+    )
+    for lamp, _ in lamps:
+        print("- platform: xiaomi_miio_opple_light")
+        print("  name: fake_%s" % lamp.host.replace(".", "_"))
+        print("  host: %s" % lamp.host)
+        print("  token: %s" % lamp.token)
+    _LOGGER.info("%d lamps running", len(lamps))
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--first-host", default=DEFAULT_FIRST_HOST)
+    parser.add_argument("--port", type=int, default=protocol.MIIO_PORT)
+    parser.add_argument("--token", default=DEFAULT_TOKEN)
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds")
+    parser.add_argument("--jitter", type=float, default=0, help="milliseconds")
+    parser.add_argument("--loss", type=float, default=0, help="drop probability")
+    parser.add_argument("--fail-rate", type=float, default=0, help="non-ok write probability")
+    parser.add_argument("--brightness-floor", type=int, default=7)
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()